@@ -1,123 +1,235 @@
 from mesa import Agent, Model
-from mesa.time import RandomActivation
-import random
-from rdflib import Graph, Namespace
+from mesa.time import BaseScheduler
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import networkx as nx
+import numpy as np
+from rdflib import Graph, Namespace, RDF
+
+logger = logging.getLogger(__name__)
 
 # Load and parse the ontology
 ontology_file = "healthcareonto.rdf"  # Ensure this is the path to your RDF file
-ontology = Graph()
+ontology_cache = "healthcareonto.nt"  # N-Triples copy, much faster to parse than RDF/XML
+ontology = Graph(store="Memory")  # Indexed in-memory store (rdflib's successor to IOMemory)
 try:
-    ontology.parse(ontology_file, format="xml")
+    # The cache is only trusted next to its source: a missing .rdf is an error even if the .nt exists
+    use_cache = os.path.isfile(ontology_cache) and os.path.getmtime(ontology_cache) >= os.path.getmtime(ontology_file)
+    if use_cache:
+        ontology.parse(ontology_cache, format="nt")
+    else:
+        ontology.parse(ontology_file, format="xml")
 except Exception as e:
-    print(f"Error loading ontology file: {e}")
+    logger.error("Error loading ontology file: %s", e)
     exit(1)  # Exit if the ontology can't be loaded
 
+if not use_cache:
+    # Write to a temporary file and swap it in, so an interrupted run never leaves a truncated cache
+    cache_tmp = f"{ontology_cache}.{os.getpid()}.tmp"
+    try:
+        ontology.serialize(cache_tmp, format="nt", encoding="utf-8")
+        os.replace(cache_tmp, ontology_cache)
+    except OSError as e:
+        logger.warning("Could not write ontology cache %s: %s", ontology_cache, e)
+        if os.path.exists(cache_tmp):
+            os.remove(cache_tmp)
+
+# Mirror the triples into a directed graph keyed by predicate for fast traversal
+ontology_graph = nx.MultiDiGraph()
+for subj, pred, obj in ontology:
+    ontology_graph.add_edge(str(subj), str(obj), key=str(pred))
+
 # Define namespace (modify as per your ontology)
-HEALTH = Namespace("http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15/")
+HEALTH = Namespace("http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#")
+
+# IRIs used to walk disease -> treatment -> doctor -> nurse, and disease -> ward.
+# Stored as plain strings, matching the node and edge keys of ontology_graph.
+HAS_TREATMENT = str(HEALTH.hasTreatment)
+ASSIGN_TO = str(HEALTH.assignto)
+HAS_NURSE = str(HEALTH.hasNurse)
+HAS_WARD = str(HEALTH.hasward)
+RDF_TYPE = str(RDF.type)
+TREATMENT = str(HEALTH.Treatment)
+NURSE = str(HEALTH.Nurse)
+
+
+def has_type(node, rdf_type):
+    """Check whether a node is declared with the given rdf:type."""
+    return ontology_graph.has_edge(node, rdf_type, key=RDF_TYPE)
+
+
+def build_lookup(predicate, subject_type=None, object_type=None):
+    """Map subject local names to the first object local name for a predicate."""
+    lookup = {}
+    for subject, obj, key in ontology_graph.edges(keys=True):
+        if key != predicate:
+            continue
+        if subject_type is not None and not has_type(subject, subject_type):
+            continue
+        if object_type is not None and not has_type(obj, object_type):
+            continue
+        lookup.setdefault(subject.rpartition("#")[2], obj.rpartition("#")[2])
+    return lookup
+
+
+# The ontology is static during a run, so resolve every relation once up front
+DISEASE_TO_TREATMENT = build_lookup(HAS_TREATMENT)
+TREATMENT_TO_DOCTOR = build_lookup(ASSIGN_TO, subject_type=TREATMENT)
+DOCTOR_TO_NURSE = build_lookup(HAS_NURSE, object_type=NURSE)
+DISEASE_TO_WARD = build_lookup(HAS_WARD)
+
+
+@functools.lru_cache(maxsize=None)
+def resolve(disease):
+    """Return the (treatment, doctor, nurse, ward) assigned for a disease."""
+    treatment = DISEASE_TO_TREATMENT.get(disease, "No treatment found in ontology")
+    doctor = TREATMENT_TO_DOCTOR.get(treatment, "No doctor found in ontology")
+    nurse = DOCTOR_TO_NURSE.get(doctor, "No nurse found in ontology")
+    ward = DISEASE_TO_WARD.get(disease, "No ward found in ontology")
+    return treatment, doctor, nurse, ward
+
+
+# Integer encoding of diseases and resources for the model's per-patient arrays
+DISEASES = ["Disease1", "Disease2", "Disease3", "Disease4"]
+DISEASE_INDEX = {disease: i for i, disease in enumerate(DISEASES)}
+# Join the four relations once per disease at load time
+RESOLVED = [resolve(disease) for disease in DISEASES]
+RESOURCE_NAMES = sorted({name for names in RESOLVED for name in names})
+RESOURCE_INDEX = {name: i for i, name in enumerate(RESOURCE_NAMES)}
+# One row per disease: (treatment, doctor, nurse, ward) resource ids
+TREATMENT_COL, DOCTOR_COL, NURSE_COL, WARD_COL = range(4)
+ASSIGNMENT_TABLE = np.array(
+    [[RESOURCE_INDEX[name] for name in names] for names in RESOLVED],
+    dtype=np.int32,
+)
+
+
+# Below this many rows np.take beats importing and JIT-compiling the Numba kernel
+NUMBA_MIN_ROWS = 100_000
+
+
+@functools.lru_cache(maxsize=None)
+def numba_kernel():
+    """Import Numba and compile the gather kernel on first use; None if Numba is not installed."""
+    try:
+        from numba import njit
+    except ImportError:
+        return None
+
+    # nogil lets HealthcareModel run chunks of the gather on several threads at once
+    @njit(nogil=True, cache=True)
+    def gather(disease_ids, table, out):
+        for i in range(disease_ids.size):
+            row = disease_ids[i]
+            for j in range(table.shape[1]):
+                out[i, j] = table[row, j]
+
+    return gather
+
+
+# Below this many patients one gather call is cheaper than handing chunks to threads
+THREADED_MIN_ROWS = 200_000
+
+
+def numpy_gather(disease_ids, table, out):
+    """Fill out[i] with the table row for disease_ids[i] using np.take."""
+    np.take(table, disease_ids, axis=0, out=out)
+
+
+def select_gather(num_rows):
+    """Pick the gather function for a batch of num_rows rows in total."""
+    kernel = numba_kernel() if num_rows >= NUMBA_MIN_ROWS else None
+    return kernel if kernel is not None else numpy_gather
+
 
 class PatientAgent(Agent):
-    """Represents a patient with a disease."""
+    """Represents a patient with a disease.
+
+    Assignments live in the model's assignment_ids array at row self.row; the
+    treatment, doctor, nurse and ward names are looked up from it on access.
+    """
+    __slots__ = ("disease", "row", "steps_remaining")
+
     def __init__(self, unique_id, model, disease):
         super().__init__(unique_id, model)
+        self.reset(unique_id, disease)
+
+    def reset(self, unique_id, disease):
+        """Prepare the agent for a new admission, so pooled agents can be reused."""
+        self.unique_id = unique_id
         self.disease = disease
-        self.treatment = None  # Initialize treatment
-        self.doctor = None     # Initialize doctor
-        self.nurse = None      # Initialize nurse
-        self.ward = None       # Initialize ward
+        self.row = self.model.record_patient(self)  # Assignments start out unset
+        self.steps_remaining = self.model.length_of_stay  # None means the patient never leaves
+
+    def resource(self, col):
+        """Return the resource name stored in a column of this patient's row, or None if unset."""
+        if self.row is None:  # Discharged and waiting in the pool
+            return None
+        resource_id = self.model.assignment_ids[self.row, col]
+        return RESOURCE_NAMES[resource_id] if resource_id >= 0 else None
+
+    @property
+    def treatment(self):
+        """Assigned treatment name, or None before assignment."""
+        return self.resource(TREATMENT_COL)
+
+    @property
+    def doctor(self):
+        """Assigned doctor name, or None before assignment."""
+        return self.resource(DOCTOR_COL)
+
+    @property
+    def nurse(self):
+        """Assigned nurse name, or None before assignment."""
+        return self.resource(NURSE_COL)
+
+    @property
+    def ward(self):
+        """Assigned ward name, or None before assignment."""
+        return self.resource(WARD_COL)
+
+    def assign(self, col):
+        """Fill one column of this patient's row from the assignment table."""
+        self.model.assignment_ids[self.row, col] = ASSIGNMENT_TABLE[self.model.disease_ids[self.row], col]
 
     def assign_treatment(self):
         """Retrieve treatment for the patient's disease from the ontology."""
-        print(f"Searching for treatment for disease: {self.disease}")
-        try:
-            treatment_query = f"""
-            SELECT ?treatment
-            WHERE {{
-                ?disease <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#hasTreatment> ?treatment .
-                FILTER (?disease = <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#{self.disease}>)
-            }}
-            """
-            treatment_results = list(ontology.query(treatment_query))
-            if treatment_results:
-                self.treatment = str(treatment_results[0][0].split("#")[-1])
-            else:
-                self.treatment = "No treatment found in ontology"
-        except Exception as e:
-            print(f"Error retrieving treatment for patient {self.unique_id}: {e}")
+        logger.debug("Searching for treatment for disease: %s", self.disease)
+        self.assign(TREATMENT_COL)
 
     def assign_doctor(self):
         """Assign a doctor to the patient based on the ontology."""
-        try:
-            doctor_query = f"""
-            SELECT ?doctor
-            WHERE {{
-                ?treatment rdf:type <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#Treatment> .
-                ?treatment <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#assignto> ?doctor .
-                FILTER (?treatment = <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#{self.treatment}>)
-            }}
-            """
-            doctor_results = list(ontology.query(doctor_query))
-            if doctor_results:
-                self.doctor = str(doctor_results[0][0].split("#")[-1])
-            else:
-                self.doctor = "No doctor found in ontology"
-        except Exception as e:
-            print(f"Error retrieving doctor for patient {self.unique_id}: {e}")
+        self.assign(DOCTOR_COL)
 
     def assign_nurse(self):
         """Assign a nurse to the patient based on the ontology."""
-        try:
-            nurse_query = f"""
-            SELECT ?nurse
-            WHERE {{
-                ?nurse rdf:type <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#Nurse> .
-                ?doctor<http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#hasNurse> ?nurse . 
-                FILTER (?doctor = <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#{self.doctor}>)
-            }}
-            """
-            nurse_results = list(ontology.query(nurse_query))
-            if nurse_results:
-                self.nurse = str(nurse_results[0][0].split("#")[-1])
-            else:
-                self.nurse = "No nurse found in ontology"
-        except Exception as e:
-           (f"Error retrieving nurse for patient {self.unique_id}: {e}")
+        self.assign(NURSE_COL)
 
     def assign_ward(self):
         """Assign a ward to the patient based on the ontology."""
-        try:
-            ward_query = f"""
-            SELECT ?ward
-            WHERE {{
-                ?disease <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#hasward> ?ward .
-                FILTER (?disease = <http://www.semanticweb.org/hansa/ontologies/2024/11/untitled-ontology-15#{self.disease}>)
-            }}
-            """
-            ward_results = list(ontology.query(ward_query))
-            if ward_results:
-                self.ward = str(ward_results[0][0].split("#")[-1])
-            else:
-                self.ward = "No ward found in ontology"
-        except Exception as e:
-            print(f"Error retrieving ward for patient {self.unique_id}: {e}")
+        self.assign(WARD_COL)
 
     def step(self):
         """Simulate the patient's step in the environment."""
-        try:
-            self.assign_treatment()
-            self.assign_doctor()
-            self.assign_nurse()
-            self.assign_ward()
-            print(f"Patient {self.unique_id} treated for {self.disease}:")
-            print(f"  - Treatment: {self.treatment}")
-            print(f"  - Doctor: {self.doctor}")
-            print(f"  - Nurse: {self.nurse}")
-            print(f"  - Ward: {self.ward}")
-        except Exception as e:
-            print(f"Error in step for patient {self.unique_id}: {e}")
+        # Assignments were already resolved for every patient by HealthcareModel.step
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Patient %s treated for %s:\n  - Treatment: %s\n  - Doctor: %s\n  - Nurse: %s\n  - Ward: %s",
+                self.unique_id, self.disease, self.treatment, self.doctor, self.nurse, self.ward,
+            )
+
+        if self.steps_remaining is not None:
+            self.steps_remaining -= 1
+            if self.steps_remaining <= 0:
+                self.model.discharged.append(self)
 
 
 class DoctorAgent(Agent):
     """Represents a doctor."""
+    __slots__ = ("name",)
+
     def __init__(self, unique_id, model, name):
         super().__init__(unique_id, model)
         self.name = name
@@ -129,6 +241,8 @@ class DoctorAgent(Agent):
 
 class NurseAgent(Agent):
     """Represents a nurse."""
+    __slots__ = ("name",)
+
     def __init__(self, unique_id, model, name):
         super().__init__(unique_id, model)
         self.name = name
@@ -140,6 +254,8 @@ class NurseAgent(Agent):
 
 class WardAgent(Agent):
     """Represents a ward in the hospital."""
+    __slots__ = ("name",)
+
     def __init__(self, unique_id, model, name):
         super().__init__(unique_id, model)
         self.name = name
@@ -151,54 +267,171 @@ class WardAgent(Agent):
 
 class HealthcareModel(Model):
     """A healthcare model with patients, doctors, nurses, and wards."""
-    def __init__(self, num_doctors, num_nurses, num_wards):
-        self.schedule = RandomActivation(self)
+    def __init__(self, num_doctors, num_nurses, num_wards, seed=None, draw_block=1024,
+                 length_of_stay=None, workers=None):
+        self.schedule = BaseScheduler(self)  # Activation order does not affect outcomes, so skip the shuffle
+
+        # Patients leave after length_of_stay steps and their agents are kept for reuse
+        self.length_of_stay = length_of_stay
+        self.patient_pool = []
+        self.discharged = []
+
+        # Doctors, nurses and wards have no step behaviour, so they are kept in
+        # plain lists for sampling and never added to the schedule
 
         # Add doctors
         self.doctors = []
         for i in range(num_doctors):
             doctor = DoctorAgent(i, self, name=f"Doctor {i}")
-            self.schedule.add(doctor)
             self.doctors.append(doctor)
 
         # Add nurses
         self.nurses = []
         for i in range(num_nurses):
             nurse = NurseAgent(i + num_doctors, self, name=f"Nurse {i}")
-            self.schedule.add(nurse)
             self.nurses.append(nurse)
 
         # Add wards
         self.wards = []
         for i in range(num_wards):
             ward = WardAgent(i + num_doctors + num_nurses, self, name=f"Ward {i}")
-            self.schedule.add(ward)
             self.wards.append(ward)
 
         self.patient_counter = num_doctors + num_nurses + num_wards
 
+        # Per-patient state as parallel arrays. Rows [0:num_patients] hold the admitted
+        # patients, and row_patients maps each row back to its agent
+        self.num_patients = 0
+        self.row_patients = []
+        self.disease_ids = np.empty(16, dtype=np.int32)
+        self.assignment_ids = np.empty((16, ASSIGNMENT_TABLE.shape[1]), dtype=np.int32)
+
+        # Random picks (disease, doctor, nurse, ward) are drawn in blocks of draw_block steps
+        self.rng = np.random.default_rng(seed)
+        self.draw_block = draw_block
+        self.draws = None
+        self.draw_pos = draw_block
+
+        # With workers > 1, large per-tick gathers are split across a thread pool that is
+        # created on first use and released by close()
+        self.workers = workers
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut down the gather thread pool, if one was started."""
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def refill_draws(self):
+        """Draw the next block of (disease, doctor, nurse, ward) indices in one call."""
+        highs = [len(DISEASES), len(self.doctors), len(self.nurses), len(self.wards)]
+        self.draws = self.rng.integers(0, highs, size=(self.draw_block, 4)).tolist()
+        self.draw_pos = 0
+
+    def resolve_assignments(self):
+        """Refresh assignment_ids for every admitted patient.
+
+        With workers > 1 the gather is split into one chunk per worker, but only
+        once there are THREADED_MIN_ROWS patients; below that the thread hand-off
+        costs more than the gather and a single call is used.
+        """
+        disease_ids = self.disease_ids[:self.num_patients]
+        assignments = self.assignment_ids[:self.num_patients]
+        # Choose the kernel once for the whole batch, on this thread, so chunks smaller than
+        # NUMBA_MIN_ROWS still use it and worker threads never race to compile it
+        gather = select_gather(self.num_patients)
+        if not self.workers or self.workers < 2 or self.num_patients < THREADED_MIN_ROWS:
+            gather(disease_ids, ASSIGNMENT_TABLE, assignments)
+        else:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            bounds = np.linspace(0, self.num_patients, self.workers + 1, dtype=np.intp)
+            futures = [
+                self.executor.submit(gather, disease_ids[lo:hi], ASSIGNMENT_TABLE, assignments[lo:hi])
+                for lo, hi in zip(bounds[:-1], bounds[1:])
+            ]
+            for future in futures:
+                future.result()
+        return assignments
+
+    def record_patient(self, patient):
+        """Append a row for an admitted patient, growing the arrays when full, and return its index."""
+        if self.num_patients == len(self.disease_ids):
+            self.disease_ids = np.resize(self.disease_ids, 2 * len(self.disease_ids))
+            self.assignment_ids = np.resize(self.assignment_ids, (len(self.disease_ids), ASSIGNMENT_TABLE.shape[1]))
+        row = self.num_patients
+        self.disease_ids[row] = DISEASE_INDEX[patient.disease]
+        self.assignment_ids[row] = -1
+        self.row_patients.append(patient)
+        self.num_patients += 1
+        return row
+
+    def release_patient(self, patient):
+        """Free a discharged patient's row by moving the last admitted patient into it."""
+        row, last = patient.row, self.num_patients - 1
+        if row != last:
+            self.disease_ids[row] = self.disease_ids[last]
+            self.assignment_ids[row] = self.assignment_ids[last]
+            moved = self.row_patients[last]
+            moved.row = row
+            self.row_patients[row] = moved
+        self.row_patients.pop()
+        self.num_patients -= 1
+        patient.row = None
+
     def step(self):
         """Advance the model by one step."""
-        disease = random.choice(["Disease1", "Disease2", "Disease3", "Disease4"])
-        patient = PatientAgent(self.patient_counter, self, disease)
+        if self.draw_pos == self.draw_block:
+            self.refill_draws()
+        disease_idx, doctor_idx, nurse_idx, ward_idx = self.draws[self.draw_pos]
+        self.draw_pos += 1
+
+        disease = DISEASES[disease_idx]
+        if self.patient_pool:
+            patient = self.patient_pool.pop()
+            self.register_agent(patient)
+            patient.reset(self.patient_counter, disease)
+        else:
+            patient = PatientAgent(self.patient_counter, self, disease)
         self.patient_counter += 1
         self.schedule.add(patient)
+        patient.assign_treatment()  # Treatment first, as the doctor follows from it
 
         # Assign doctors, nurses, and wards
-        doctor = random.choice(self.doctors)
-        nurse = random.choice(self.nurses)
-        ward = random.choice(self.wards)
+        doctor = self.doctors[doctor_idx]
+        nurse = self.nurses[nurse_idx]
+        ward = self.wards[ward_idx]
 
         # Assign each agent (doctor, nurse, ward) to the patient
         doctor.assign_patient(patient)
         nurse.assign_patient(patient)
         ward.assign_patient(patient)
 
-        print(f"\nNew Patient {patient.unique_id} arrives with disease: {disease}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("New Patient %s arrives with disease: %s", patient.unique_id, disease)
+        # Resolve every admitted patient with a single gather over the table
+        self.resolve_assignments()
         self.schedule.step()
 
-# Running the model
+        # Return discharged patients to the pool once the schedule has finished iterating.
+        # Pooled agents are deregistered, so model.agents only lists admitted patients and staff
+        for patient in self.discharged:
+            self.schedule.remove(patient)
+            self.deregister_agent(patient)
+            self.release_patient(patient)
+            self.patient_pool.append(patient)
+        self.discharged.clear()
+
+# Running the model (raise the level to INFO or DEBUG to trace patients)
+logging.basicConfig(level=logging.WARNING, format="%(message)s")
 model = HealthcareModel(num_doctors=3, num_nurses=2, num_wards=2)
 for i in range(3):  # Run for 3 steps
-    print(f"\n=== Step {i + 1} ===")
+    logger.info("=== Step %d ===", i + 1)
     model.step()